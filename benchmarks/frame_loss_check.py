@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# Replays synthetic F1 2019 header streams through FrameTracker and checks the loss
+# estimate and stale/flashback handling. Exits with an error when a check fails.
+#
+#   python benchmarks/frame_loss_check.py
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from f1_2019_telemetry_reader import FrameTracker
+
+PACKET_ID = 6 # Telemetry
+
+
+def stream(fps, send_rate, duration, jitter=0.0, seed=1):
+    # (session_time, frame) of every packet. Frame times jitter by `jitter` of a frame (frame pacing),
+    # the game sends on the first frame after each send tick (every frame when fps <= rate).
+    rnd = random.Random(seed)
+    packets = []
+    session_time, tick = 0.0, -1
+    for frame in range(int(duration * fps)):
+        session_time += (1.0 + rnd.uniform(-jitter, jitter)) / fps
+        current = int(session_time * send_rate)
+        if fps <= send_rate or current != tick:
+            packets.append((session_time, frame))
+        tick = current
+    return packets
+
+
+def replay(packets, tracker=None):
+    tracker = tracker or FrameTracker()
+    accepted = 0
+    for session_time, frame in packets:
+        if tracker.accept((PACKET_ID, 1, session_time, frame, 0)):
+            accepted += 1
+    return tracker, accepted
+
+
+def lossOf(tracker):
+    return tracker.getStats()['Telemetry']['lost']
+
+
+def check(name, condition, detail):
+    print('%-40s %s  %s' % (name, 'ok' if condition else 'FAILED', detail))
+    return condition
+
+
+def runChecks():
+    results = []
+
+    for fps, rate in [(60, 60), (100, 60), (144, 60), (75, 20)]:
+        tracker, _ = replay(stream(fps, rate, 10.0, jitter=0.1))
+        results.append(check('%d fps / %d Hz jittered, no loss' % (fps, rate), lossOf(tracker) == 0,
+                             'lost %d' % lossOf(tracker)))
+
+    packets = stream(100, 60, 10.0)
+    rnd = random.Random(2)
+    kept = [x for i, x in enumerate(packets) if i < 20 or rnd.random() > 0.05]
+    tracker, _ = replay(kept)
+    missing = len(packets) - len(kept)
+    results.append(check('100 fps / 60 Hz, 5% loss', abs(lossOf(tracker) - missing) <= missing * 0.2,
+                         'lost %d, missing %d' % (lossOf(tracker), missing)))
+
+    packets = stream(60, 60, 2.0)
+    swapped = packets[:50] + [packets[51], packets[50]] + packets[52:]
+    tracker, accepted = replay(swapped)
+    results.append(check('reordered packet is stale', accepted == len(packets) - 1,
+                         'accepted %d of %d' % (accepted, len(packets))))
+
+    # 1 s flashback, shorter than any frame threshold would allow
+    packets = stream(60, 60, 3.0)
+    tracker, accepted = replay(packets[:120] + packets[60:])
+    results.append(check('short flashback is accepted', accepted == 120 + len(packets) - 60,
+                         'accepted %d, flashbacks %d' % (accepted, tracker.flashbacks)))
+    return all(results)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if runChecks() else 1)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# Measures what a game reader costs on HUD startup (module import + reader construction)
+# and on its first start() (layout build). Every reader runs in a fresh interpreter,
+# so the numbers are cold start times.
+#
+#   python benchmarks/startup_benchmark.py [repeats]
+
+import os
+import subprocess
+import sys
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+
+# module, reader construction (init_script), layout build done by the first start()
+READERS = [
+    ('f1_2019_telemetry_reader', 'f1_2019_telemetry_reader.DataReceiver(f1_2019_telemetry_reader.F12019Parser())', None),
+    ('assetto_corsa_telemetry_reader', 'assetto_corsa_telemetry_reader.AssettoCorsaData()', 'assetto_corsa_telemetry_reader.getPhysicsLayout()'),
+    ('assetto_corsa_telemetry_reader_py3', 'assetto_corsa_telemetry_reader_py3.AssettoCorsaData()', 'assetto_corsa_telemetry_reader_py3.getPhysicsLayout()'),
+    ('raceroom_telemetry_reader', 'raceroom_telemetry_reader.RaceRoomData()', 'raceroom_telemetry_reader.loadLayout("r3e")'),
+]
+
+MEASURE_SCRIPT = '''
+import sys, time
+sys.stdout = open('{devnull}', 'w')
+t0 = time.time()
+import {module}
+t1 = time.time()
+{init}
+t2 = time.time()
+{layout}
+t3 = time.time()
+{layout}
+t4 = time.time()
+sys.stdout = sys.__stdout__
+print('%f %f %f %f' % (t1 - t0, t2 - t1, t3 - t2, t4 - t3))
+'''
+
+
+def measure(module, init, layout):
+    script = MEASURE_SCRIPT.format(devnull=os.devnull.replace('\\', '\\\\'), module=module,
+                                   init=init, layout=layout or 'pass')
+    proc = subprocess.Popen([sys.executable, '-c', script], cwd=SCRIPTS_DIR,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = proc.communicate()
+    if proc.returncode:
+        return None, err.decode('utf-8', 'replace').strip().splitlines()[-1]
+    return [float(x) * 1000 for x in out.decode('utf-8').split()], None
+
+
+def benchStartup(repeats=5):
+    results = {}
+    for module, init, layout in READERS:
+        samples = []
+        for _ in range(repeats):
+            times, error = measure(module, init, layout)
+            if error:
+                results[module] = error
+                break
+            samples.append(times)
+        else:
+            # best of N, least disturbed by the rest of the system
+            results[module] = [min(x) for x in zip(*samples)]
+    return results
+
+
+if __name__ == '__main__':
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print('%-36s %10s %10s %12s %12s' % ('reader', 'import ms', 'init ms', 'layout ms', 'cached ms'))
+    for module, result in sorted(benchStartup(repeats).items()):
+        if not isinstance(result, list):
+            print('%-36s skipped: %s' % (module, result))
+        else:
+            print('%-36s %10.2f %10.2f %12.3f %12.3f' % tuple([module] + result))
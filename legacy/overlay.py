@@ -5,6 +5,12 @@ import os
 import platform
 import time
 
+# reader channels for the overlay frame: overlay channel -> (reader key, element index or None)
+F1_2019_CHANNELS = {'wheelSlipRL': ('wheelSlip', 0), 'wheelSlipRR': ('wheelSlip', 1),
+                    'wheelSlipFL': ('wheelSlip', 2), 'wheelSlipFR': ('wheelSlip', 3)}
+ASSETTO_CORSA_CHANNELS = {'wheelSlipFL': ('wheelSlip', 0), 'wheelSlipFR': ('wheelSlip', 1),
+                          'wheelSlipRL': ('wheelSlip', 2), 'wheelSlipRR': ('wheelSlip', 3)}
+
 class Overlay:
     def __init__(self):
         prefix, ext = ('', '.dll') if platform.system() == 'Windows' else ('lib', '.so')
@@ -18,23 +24,57 @@ class Overlay:
         self.lib.overlay_update_wheel_slip.argtypes=[c.c_double, c.c_double, c.c_double, c.c_double]
         self.lib.overlay_update_wheel_slip.restype=None
 
+        self.lib.overlay_channel_count.argtypes=None
+        self.lib.overlay_channel_count.restype=c.c_int
+
+        self.lib.overlay_channel_name.argtypes=[c.c_int]
+        self.lib.overlay_channel_name.restype=c.c_char_p
+
+        self.lib.overlay_update_frame.argtypes=[c.POINTER(c.c_double), c.c_int]
+        self.lib.overlay_update_frame.restype=None
+
+        # channel schema and frame buffer are created once, updates only fill the buffer
+        count = self.lib.overlay_channel_count()
+        self.channels = [self.lib.overlay_channel_name(i).decode('ascii') for i in range(count)]
+        self.frame = (c.c_double * count)()
+        self._bindings = []
+
         self._start()
 
     def updateWheelSlip(self, rl, rr, fl, fr):
         self.lib.overlay_update_wheel_slip(rl, rr, fl, fr)
 
+    def channelIndex(self, name):
+        return self.channels.index(name)
+
+    # mapping: overlay channel -> (reader key, element index or None), e.g. F1_2019_CHANNELS
+    def bind(self, mapping):
+        self._bindings = [(self.channelIndex(name), key, element) for name, (key, element) in mapping.items()]
+
+    # fills the frame from a reader data dictionary and sends it with one call
+    def updateFromData(self, data):
+        frame = self.frame
+        for index, key, element in self._bindings:
+            frame[index] = data[key] if element is None else data[key][element]
+        self.pushFrame()
+
+    # sends the current frame buffer, fill it with frame[channelIndex(name)] = value
+    def pushFrame(self):
+        self.lib.overlay_update_frame(self.frame, len(self.frame))
+
     def _start(self):
          self.lib.overlay_start()
 
 
 if __name__ == '__main__':
     overlay = Overlay()
+    overlay.bind(F1_2019_CHANNELS)
     a = 0
 
     while True:
         a += 0.01
         wheelSlip = [(a)%1, (a+0.01)%0.1, (a+0.0333)%0.3, (a+0.0431531)%0.06]
 
-        overlay.updateWheelSlip(*wheelSlip)
+        overlay.updateFromData({'wheelSlip': wheelSlip})
 
         time.sleep(1) # only for example
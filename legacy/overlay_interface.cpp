@@ -8,6 +8,19 @@
 
 static PluginSelectorWindow* window = nullptr;
 
+// frame buffer schema for overlay_update_frame, index of each channel in the buffer
+enum OverlayChannel
+{
+    WHEEL_SLIP_RL,
+    WHEEL_SLIP_RR,
+    WHEEL_SLIP_FL,
+    WHEEL_SLIP_FR,
+    CHANNEL_COUNT
+};
+
+static const char* CHANNEL_NAMES[CHANNEL_COUNT] = {"wheelSlipRL", "wheelSlipRR", "wheelSlipFL",
+                                                   "wheelSlipFR"};
+
 #ifdef __cplusplus
 extern "C"
 {
@@ -56,6 +69,31 @@ extern "C"
         window->wheelSlip->updateSlip(rl, rr, fl, fr);
     }
 
+    int overlay_channel_count()
+    {
+        return CHANNEL_COUNT;
+    }
+
+    const char* overlay_channel_name(int index)
+    {
+        if (index < 0 || index >= CHANNEL_COUNT)
+        {
+            return nullptr;
+        }
+        return CHANNEL_NAMES[index];
+    }
+
+    // whole telemetry frame in one call, values are ordered by overlay_channel_name()
+    void overlay_update_frame(const double* values, int count)
+    {
+        if (count < CHANNEL_COUNT)
+        {
+            return;
+        }
+        window->wheelSlip->updateSlip(values[WHEEL_SLIP_RL], values[WHEEL_SLIP_RR],
+                                      values[WHEEL_SLIP_FL], values[WHEEL_SLIP_FR]);
+    }
+
 #ifdef __cplusplus
 }  // extern C
 #endif
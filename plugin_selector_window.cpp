@@ -1,6 +1,7 @@
 #include "plugin_selector_window.hpp"
 
 #include <QApplication>
+#include <QCheckBox>
 #include <QDebug>
 #include <QDir>
 #include <QGroupBox>
@@ -22,7 +23,8 @@
 
 #include <iostream>
 
-static const size_t UPDATES_PER_SEC = 60;
+static const size_t UPDATES_PER_SEC    = 60;
+static const size_t DETECTIONS_PER_SEC = 2;
 
 namespace
 {
@@ -80,7 +82,11 @@ void jsonToString(QString& stringified, const QJsonValue& value)
 }  // namespace
 
 PluginSelectorWindow::PluginSelectorWindow()
-    : startedGameParser{nullptr}, timer{nullptr}, table{nullptr}
+    : startedGameParser{nullptr},
+      timer{nullptr},
+      detectTimer{nullptr},
+      table{nullptr},
+      autoDetect{nullptr}
 {
     this->setWindowTitle("Plugin Selector");
     this->setAttribute(Qt::WA_DeleteOnClose);
@@ -93,6 +99,25 @@ PluginSelectorWindow::PluginSelectorWindow()
     timer = new QTimer();
     this->connect(timer, &QTimer::timeout, this, [&] { this->refreshData(); });
     timer->start(1000 / UPDATES_PER_SEC);
+
+    // background probes only, game readers are still loaded on their first start
+    QString udpPorts;
+    for (auto& parser : gameParsers)
+    {
+        auto port = parser.second->property("detect_udp_port").toInt();
+        if (port)
+        {
+            udpPorts += "'" + parser.second->property("game_id").toString() + "': " +
+                        QString::number(port) + ", ";
+        }
+    }
+    pyRunner.import("game_detector.py");
+    pyRunner.run("gameDetector = game_detector.GameDetector(game_detector.defaultProbes({" + udpPorts +
+                 "})); gameDetector.start()");
+
+    detectTimer = new QTimer();
+    this->connect(detectTimer, &QTimer::timeout, this, [&] { this->detectGame(); });
+    detectTimer->start(1000 / DETECTIONS_PER_SEC);
 }
 
 PluginSelectorWindow::~PluginSelectorWindow()
@@ -109,6 +134,9 @@ PluginSelectorWindow::~PluginSelectorWindow()
     }
     timer->stop();
     delete timer;
+    detectTimer->stop();
+    delete detectTimer;
+    pyRunner.run("gameDetector.stop()");
 }
 void PluginSelectorWindow::pluginEvent(const QString& plugin, const QString& event)
 {
@@ -157,6 +185,8 @@ void PluginSelectorWindow::gamePluginEvent(const QString& plugin, const QString&
             dataEntry.second->setText("");
         }
 
+        // the detector releases the reader's UDP port before the reader binds it
+        pyRunner.run("gameDetector.setActive('" + object->property("game_id").toString() + "')");
         startedGameParser = object;
         QMetaObject::invokeMethod(object, "start");
     }
@@ -166,10 +196,49 @@ void PluginSelectorWindow::gamePluginEvent(const QString& plugin, const QString&
         {
             startedGameParser = nullptr;
             QMetaObject::invokeMethod(object, "stop");
+            pyRunner.run("gameDetector.setActive('')");
+        }
+    }
+    this->updateGameParserButtons();
+}
+
+void PluginSelectorWindow::detectGame()
+{
+    if (!autoDetect->isChecked())
+    {
+        return;
+    }
+
+    auto detected = pyRunner.eval("gameDetector.getDetectedGame()");
+    if (detected.isEmpty())
+    {
+        return;
+    }
+
+    for (auto& parser : gameParsers)
+    {
+        if (parser.second->property("game_id").toString() == detected)
+        {
+            if (parser.second != startedGameParser)
+            {
+                qDebug() << "PluginSelectorWindow::detectGame starting" << parser.first;
+                this->gamePluginEvent(parser.first, "Start");
+            }
+            return;
         }
     }
 }
 
+void PluginSelectorWindow::updateGameParserButtons()
+{
+    for (auto& p : gameParserButtons)
+    {
+        auto started = gameParsers[p.first] == startedGameParser;
+        p.second.first->setStyleSheet(started ? "background: Green;" : "");
+        p.second.second->setStyleSheet(started ? "" : "background: Green;");
+    }
+}
+
 void PluginSelectorWindow::findPlugins()
 {
     {
@@ -277,6 +346,9 @@ void PluginSelectorWindow::createGUI()
     pluginsGroup->setLayout(pluginGrid);
 
     auto gameParsersGrid = new QGridLayout();
+    autoDetect           = new QCheckBox("Auto-detect running game");
+    autoDetect->setChecked(true);
+    gameParsersGrid->addWidget(autoDetect, 0, 0, 1, 4);
 
     receiverGroup->setLayout(gameParsersGrid);
     this->setCentralWidget(tabWidget);
@@ -322,7 +394,7 @@ void PluginSelectorWindow::createGUI()
         ++grindIndex;
     }
 
-    grindIndex = 0;
+    grindIndex = 1;
     for (const auto& p : this->gameParsers)
     {
         auto& plugin = p.first;
@@ -336,18 +408,17 @@ void PluginSelectorWindow::createGUI()
         auto stop  = new QPushButton("stop");
 
         stop->setStyleSheet("background: Green;");
+        gameParserButtons[plugin] = {start, stop};
 
         auto meta = object->metaObject();
 
+        // manual choice wins over auto-detection
         if (meta->indexOfMethod("start()") != -1)
         {
             gameParsersGrid->addWidget(start, grindIndex, 2);
             this->connect(start, &QPushButton::clicked, this, [=] {
+                autoDetect->setChecked(false);
                 this->gamePluginEvent(plugin, "Start");
-                QString s;
-                stop->setStyleSheet(s);
-                s = "background: Green;";
-                start->setStyleSheet(s);
             });
         }
 
@@ -355,11 +426,8 @@ void PluginSelectorWindow::createGUI()
         {
             gameParsersGrid->addWidget(stop, grindIndex, 3);
             this->connect(stop, &QPushButton::clicked, this, [=] {
+                autoDetect->setChecked(false);
                 this->gamePluginEvent(plugin, "Stop");
-                QString s;
-                start->setStyleSheet(s);
-                s = "background: Green;";
-                stop->setStyleSheet(s);
             });
         }
         ++grindIndex;
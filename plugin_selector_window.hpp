@@ -7,6 +7,8 @@
 #include <QQmlApplicationEngine>
 #include <map>
 
+class QCheckBox;
+class QPushButton;
 class QQuickWindow;
 class QTimer;
 class QTableWidget;
@@ -24,6 +26,8 @@ class PluginSelectorWindow : public QMainWindow
     void pluginEvent(const QString& plugin, const QString& action);
     void gamePluginEvent(const QString& plugin, const QString& action);
     void refreshData();
+    void detectGame();
+    void updateGameParserButtons();
     void findPlugins();
     void createGUI();
 
@@ -31,10 +35,13 @@ class PluginSelectorWindow : public QMainWindow
     std::map<QString, QQuickWindow*>     qmlPlugins;
     std::map<QString, QObject*>          gameParsers;
     std::map<QString, QTableWidgetItem*> dataEntries;
+    std::map<QString, std::pair<QPushButton*, QPushButton*>> gameParserButtons;  // start, stop
     PythonRunner                         pyRunner;
     QObject*                             startedGameParser;
     QTimer*                              timer;
+    QTimer*                              detectTimer;
     QTableWidget*                        table;
+    QCheckBox*                           autoDetect;
 };
 
 #endif  // PLUGINSELECTORWINDOW_H
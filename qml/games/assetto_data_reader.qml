@@ -1,8 +1,9 @@
 import "../lib"
 
 DataReader {
+    game_id : "assetto_corsa";
     import_filename : "assetto_corsa_telemetry_reader.py";
-    init_script : "assettoReader = assetto_corsa_telemetry_reader.AssettoCorsaData()";
+    init_script : "assettoReader = assetto_corsa_telemetry_reader.AssettoCorsaData(); assettoReader.setFilters([('wheelSlip', 'ema', 0.3)]); assettoReader.setForecast()";
     start_script : "assettoReader.start()";
     stop_script : "assettoReader.stop()";
     get_data_script : "assettoReader.getJsonData()"
@@ -1,8 +1,13 @@
 import "../lib"
 
 DataReader {
+    // game port 20789, or an endpoint of scripts/f1_2019_udp_relay.py
+    property int udp_port : 20789;
+    game_id : "f1_2019";
+    // the probe binds the port, never compete with a relay for its endpoint
+    detect_udp_port : udp_port == 20789 ? udp_port : 0;
     import_filename : "f1_2019_telemetry_reader.py";
-    init_script : "f1rcv = f1_2019_telemetry_reader.DataReceiver(f1_2019_telemetry_reader.F12019Parser())";
+    init_script : "f1rcv = f1_2019_telemetry_reader.DataReceiver(f1_2019_telemetry_reader.F12019Parser(), port=" + udp_port + "); f1rcv.setFilters([('wheelSlip', 'ema', 0.3), ('gForceLateral', 'lowpass', 5.0)])";
     start_script : "f1rcv.start()";
     stop_script : "f1rcv.stop()";
     get_data_script : "f1rcv.getJsonData()"
@@ -2,8 +2,9 @@ import QtQuick 2.12
 import "../lib"
 
 DataReader {
+    game_id : "raceroom";
     import_filename : "raceroom_telemetry_reader.py";
-    init_script : "r3ercv = raceroom_telemetry_reader.RaceRoomData()";
+    init_script : "r3ercv = raceroom_telemetry_reader.RaceRoomData(); r3ercv.setFilters([('wheelSlip', 'ema', 0.3), ('local_g_force', 'lowpass', 5.0)]); r3ercv.setForecast([('fuel_left', 0.0), ('tire_wear', 0.0)])";
     start_script : "r3ercv.start()";
     stop_script : "r3ercv.stop()";
     get_data_script : "r3ercv.getJsonData()"
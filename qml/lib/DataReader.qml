@@ -1,21 +1,30 @@
 import QtQuick 2.12
 
 Item {
+    property string game_id;  // matches probes in game_detector.py
+    property int detect_udp_port : 0;  // UDP port game_detector.py probes for this game, 0 = not probed
     property string import_filename;
     property string init_script;
     property string start_script;
     property string stop_script;
     property string get_data_script;
+    property bool loaded : false;
 
-    Component.onCompleted: {
+    // python module is imported on first start() only, keeps HUD startup cheap
+    function load()
+    {
+        if (loaded)
+            return
         if (import_filename !== "")
             pythonExecutor.import(import_filename)
         if (init_script !== "")
             pythonExecutor.run(init_script)
+        loaded = true
     }
 
     function start()
     {
+        load()
         if (start_script !== "")
             pythonExecutor.run(start_script)
     }
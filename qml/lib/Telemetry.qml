@@ -22,7 +22,8 @@ Item {
     function onReceive(message : string) {
         //console.log("Telemetry::onReceive():", message);
         var data = JSON.parse(message);
-        wheelSlip = data.wheelSlip;
+        // prefer smoothed values when the reader has a filter configured
+        wheelSlip = data.wheelSlipFiltered !== undefined ? data.wheelSlipFiltered : data.wheelSlip;
         speed = data.speed;
         brake = data.brake;
         throttle = data.throttle;
@@ -4,35 +4,90 @@ import math
 import time
 import json
 
+from telemetry_filters import FilterStage
+from consumption_forecast import ConsumptionForecast
+
+# SPageFileGraphic: packetId, status, session, 4x wchar_t[15] lap times, completedLaps
+GRAPHICS_COMPLETED_LAPS_OFFSET = 3 * 4 + 4 * 15 * 2
+GRAPHICS_COMPLETED_LAPS = struct.Struct("i")
+
+# fuel, tyre wear and brake pad/disc life run down to 0 during a stint
+DEFAULT_FORECAST = [('fuel', 0.0), ('Tyrewear', 0.0), ('padLife', 0.0), ('discLife', 0.0)]
+
 def convertDegreeArcToPercent(value):
     return max(value/360, 0)
 
 
+PHYSICS_LAYOUT = 'ifffiiffffffff 4f fffffffffffffffffffffffffffffffffffffffffffiifffiffffffffffffiiiiifiifffffffffffffffffiffffffffffffffffffffffffffffffffffffffffiifffffffffffffffffffffiifffffffffffffiiffffffff'
+_physicsLayout = None
+
+def getPhysicsLayout():
+    # compiled on first start() only and reused by all following sessions
+    global _physicsLayout
+    if _physicsLayout is None:
+        _physicsLayout = struct.Struct(PHYSICS_LAYOUT)
+    return _physicsLayout
+
+
 class AssettoCorsaData(object):
         def __init__(self):
             print('AssettoCorsaData() init()')
             self.fields = 'packetId throttle brake fuel gear rpm steerAngle speed velocity1 velocity2 velocity3 accGX accGY accGZ wheelSlipFL wheelSlipFR wheelSlipRL wheelSlipRR wheelLoadFL wheelLoadFR wheelLoadRL wheelLoadRR wheelsPressureFL wheelsPressureFR wheelsPressureRL wheelsPressureRR wheelAngularSpeedFL wheelAngularSpeedFR wheelAngularSpeedRL wheelAngularSpeedRR TyrewearFL TyrewearFR TyrewearRL TyrewearRR tyreDirtyLevelFL tyreDirtyLevelFR tyreDirtyLevelRL tyreDirtyLevelRR TyreCoreTempFL TyreCoreTempFR TyreCoreTempRL TyreCoreTempRR camberRADFL camberRADFR camberRADRL camberRADRR suspensionTravelFL suspensionTravelFR suspensionTravelRL suspensionTravelRR drs tc1 heading pitch roll cgHeight carDamagefront carDamagerear carDamageleft carDamageright carDamagecentre numberOfTyresOut pitLimiterOn abs1 kersCharge kersInput automat rideHeightfront rideHeightrear turboBoost ballast airDensity airTemp roadTemp localAngularVelX localAngularVelY localAngularVelZ finalFF performanceMeter engineBrake ersRecoveryLevel ersPowerLevel ersHeatCharging ersIsCharging kersCurrentKJ drsAvailable drsEnabled brakeTempFL brakeTempFR brakeTempRL brakeTempRR clutch tyreTempI1 tyreTempI2 tyreTempI3 tyreTempI4 tyreTempM1 tyreTempM2 tyreTempM3 tyreTempM4 tyreTempO1 tyreTempO2 tyreTempO3 tyreTempO4 isAIControlled tyreContactPointFLX tyreContactPointFLY tyreContactPointFLZ tyreContactPointFRX tyreContactPointFRY tyreContactPointFRZ tyreContactPointRLX tyreContactPointRLY tyreContactPointRLZ tyreContactPointRRX tyreContactPointRRY tyreContactPointRRZ tyreContactNormalFLX tyreContactNormalFLY tyreContactNormalFLZ tyreContactNormalFRX tyreContactNormalFRY tyreContactNormalFRZ tyreContactNormalRLX tyreContactNormalRLY tyreContactNormalRLZ tyreContactNormalRRX tyreContactNormalRRY tyreContactNormalRRZ tyreContactHeadingFLX tyreContactHeadingFLY tyreContactHeadingFLZ tyreContactHeadingFRX tyreContactHeadingFRY tyreContactHeadingFRZ tyreContactHeadingRLX tyreContactHeadingRLY tyreContactHeadingRLZ tyreContactHeadingRRX tyreContactHeadingRRY tyreContactHeadingRRZ brakeBias localVelocityX localVelocityY localVelocityZ P2PActivation P2PStatus currentMaxRpm mz1 mz2 mz3 mz4 fx1 fx2 fx3 fx4 fy1 fy2 fy3 fy4 slipRatio1 slipRatio2 slipRatio3 slipRatio4 slipAngle1 slipAngle2 slipAngle3 slipAngle4 tcinAction absInAction suspensionDamage1 suspensionDamage2 suspensionDamage3 suspensionDamage4 tyreTemp1 tyreTemp2 tyreTemp3 tyreTemp4 waterTemp brakePressureFL brakePressureFR brakePressureRL brakePressureRR frontBrakeCompound rearBrakeCompound padLifeFL padLifeFR padLifeRL padLifeRR discLifeFL discLifeFR discLifeRL discLifeRR'.replace('  ', ' ').split(' ')
-            self.layout = 'ifffiiffffffff 4f fffffffffffffffffffffffffffffffffffffffffffiifffiffffffffffffiiiiifiifffffffffffffffffiffffffffffffffffffffffffffffffffffffffffiifffffffffffffffffffffiifffffffffffffiiffffffff'
-            self.physics_shm_size = struct.calcsize(self.layout)
+            self.layout = None
+            self.physics_shm_size = 0
             self.mmapPhysic = None
             self.mmapStatic = None
+            self.mmapGraphic = None
+            self.filters = None
+            self._lastPacketId = None
+            self._lastPacketTime = None
+            self.forecast = None
 
         def start(self):
             print('AssettoCorsaData() start()')
+            if not self.layout:
+                self.layout = getPhysicsLayout()
+                self.physics_shm_size = self.layout.size
             if not self.mmapPhysic:
                 self.mmapPhysic = mmap.mmap(-1, self.physics_shm_size, "Local\\acpmf_physics",  access=mmap.ACCESS_READ)
+            if not self.mmapGraphic:
+                graphic_size = GRAPHICS_COMPLETED_LAPS_OFFSET + GRAPHICS_COMPLETED_LAPS.size
+                self.mmapGraphic = mmap.mmap(-1, graphic_size, "Local\\acpmf_graphics", access=mmap.ACCESS_READ)
             #self.mmapStatic = mmap.mmap(-1, XYZ, u"Local\\acpmf_static")
 
         def getData(self):
-            self.mmapPhysic.seek(0)
-            rawData = self.mmapPhysic.read(self.physics_shm_size)
             data = {}
-            for index, value in enumerate(struct.unpack(self.layout, rawData)):
+            for index, value in enumerate(self.layout.unpack_from(self.mmapPhysic)):
                 data[self.fields[index]] = value
 
+            data['completedLaps'] = GRAPHICS_COMPLETED_LAPS.unpack_from(self.mmapGraphic, GRAPHICS_COMPLETED_LAPS_OFFSET)[0]
+
             self._convertData(data)
+            if self.filters:
+                self.filters.apply(data, self._filterTimeStep(data))
+            if self.forecast:
+                self.forecast.apply(data)
             return data
 
+        # specs: [(channel, kind, param)], see telemetry_filters
+        def setFilters(self, specs):
+            self.filters = FilterStage(specs) if specs else None
+
+        # specs: [(channel, limit)], see consumption_forecast and DEFAULT_FORECAST
+        def setForecast(self, specs=DEFAULT_FORECAST):
+            self.forecast = ConsumptionForecast('completedLaps', specs) if specs else None
+
+        # filters advance once per physics update, not on every poll. The physics page
+        # has no simulation clock, the time step is measured between packetId changes.
+        def _filterTimeStep(self, data):
+            packet_id = data['packetId']
+            if packet_id == self._lastPacketId:
+                return 0 # same frame, repeat the last filtered values
+            now = time.time()
+            previous = self._lastPacketTime
+            self._lastPacketId, self._lastPacketTime = packet_id, now
+            return now - previous if previous is not None else None
+
         def getJsonData(self):
             return json.dumps(self.getData())
 
@@ -42,9 +97,12 @@ class AssettoCorsaData(object):
                 self.mmapPhysic.close()
             if self.mmapStatic:
                 self.mmapStatic.close()
+            if self.mmapGraphic:
+                self.mmapGraphic.close()
 
             self.mmapPhysic = None
             self.mmapStatic = None
+            self.mmapGraphic = None
 
         def _convertData(self, data):
             # TODO make these conversions immediately when reading from shm
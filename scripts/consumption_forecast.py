@@ -0,0 +1,103 @@
+# Per stint consumption forecasting (fuel, tyre/brake wear). The value of each channel
+# is sampled once per lap boundary and fitted with a least squares line kept as running
+# sums, so an update is O(1) and no samples are stored. Derived channels:
+#   <channel>PerLap         - consumption per lap (list for wheel channels)
+#   <channel>LapsRemaining  - laps until the channel reaches its limit
+#   pitLapEstimate          - last lap to pit on, worst of all channels
+# A new stint starts when a value jumps back up (refuel, new tyres) or the lap counter resets.
+# The reader may start mid-lap, so the first lap seen (and the one after a reset) is only
+# recorded - fitting starts at the next lap change.
+
+FORECAST_MIN_LAPS = 2 # lap boundaries needed before a rate is reported
+
+
+class _ChannelFit(object):
+    def __init__(self, width):
+        self.width = width
+        self.reset()
+
+    def reset(self):
+        size = max(1, self.width)
+        self.n = 0
+        self.sumX = 0.0
+        self.sumXX = 0.0
+        self.sumY = [0.0] * size
+        self.sumXY = [0.0] * size
+        self.last = None
+
+    def add(self, lap, values):
+        self.n += 1
+        self.sumX += lap
+        self.sumXX += lap * lap
+        for i, y in enumerate(values):
+            self.sumY[i] += y
+            self.sumXY[i] += lap * y
+        self.last = values
+
+    def slopes(self):
+        denominator = self.n * self.sumXX - self.sumX * self.sumX
+        if self.n < FORECAST_MIN_LAPS or not denominator:
+            return None
+        return [(self.n * sxy - self.sumX * sy) / denominator for sy, sxy in zip(self.sumY, self.sumXY)]
+
+
+class ConsumptionForecast(object):
+    # specs: [(channel, limit)], e.g. [('fuel_left', 0.0), ('tire_wear', 0.0)]
+    def __init__(self, lap_channel, specs):
+        self._lapChannel = lap_channel
+        self._specs = list(specs)
+        self._fits = None
+        self._lap = None
+        self._derived = {}
+
+    def apply(self, data):
+        # per frame cost is one comparison and merging the cached derived channels
+        lap = data[self._lapChannel]
+        if lap != self._lap:
+            self._onLapBoundary(lap, data)
+        data.update(self._derived)
+        return data
+
+    def _onLapBoundary(self, lap, data):
+        if self._fits is None:
+            self._fits = []
+            for channel, _ in self._specs:
+                value = data[channel]
+                self._fits.append(_ChannelFit(len(value) if isinstance(value, (list, tuple)) else 0))
+
+        newSession = self._lap is None or lap < self._lap
+        self._lap = lap
+
+        derived = {}
+        pitLaps = []
+        for (channel, limit), fit in zip(self._specs, self._fits):
+            value = data[channel]
+            values = [float(x) for x in value] if fit.width else [float(value)]
+            if newSession:
+                fit.reset() # not a lap boundary, wait for the next lap change
+            else:
+                if self._isNewStint(fit, values):
+                    fit.reset()
+                fit.add(lap, values)
+
+            slopes = fit.slopes()
+            perLap = [-x for x in slopes] if slopes else [None] * len(values)
+            remaining = []
+            for y, slope in zip(values, slopes or [0.0] * len(values)):
+                laps = (limit - y) / slope if slope else -1
+                remaining.append(laps if laps >= 0 else None)
+            known = [x for x in remaining if x is not None]
+            if known:
+                pitLaps.append(lap + int(min(known)))
+
+            derived[channel + 'PerLap'] = perLap if fit.width else perLap[0]
+            derived[channel + 'LapsRemaining'] = remaining if fit.width else remaining[0]
+
+        derived['pitLapEstimate'] = min(pitLaps) if pitLaps else None
+        self._derived = derived
+
+    def _isNewStint(self, fit, values):
+        # resources are only consumed during a stint, any increase means a pit stop
+        if fit.last is None:
+            return False
+        return any(y > previous + 1e-3 for y, previous in zip(values, fit.last))
@@ -4,6 +4,9 @@ import struct
 import time
 import json
 
+from telemetry_filters import FilterStage
+from layout_compiler import loadLayout, getValueFields
+
 def singleton(class_):
     instances = {}
     def getinstance(*args, **kwargs):
@@ -15,14 +18,24 @@ def singleton(class_):
 # UDP RECEIVER ##########################################
 @singleton
 class DataReceiver:
-    def __init__(self, parser):
+    def __init__(self, parser, port=20789):
         self._running = False
         self._thread = None
         self._parser = parser
         self._data = parser.getEmptyData()
-        self._port = 20789
+        self._port = port # use a relay subscriber port to share the game feed
         self._connected = False
         self._callback = None
+        self._tracker = FrameTracker()
+        self._invalid = 0
+        self._filters = {} # record name -> (FilterStage, filter input channels, filtered channels)
+        self._restarts = 0 # session changes and flashbacks seen by the tracker
+        self._flatData = {}
+        # preallocated receive buffer, views for every known packet size
+        self._buffer = bytearray(3096)
+        view = memoryview(self._buffer)
+        self._views = dict((size, view[:size]) for size in parser.PACKET_ID_TO_SIZE.values())
+        self._view = view
 
     def start(self):
         if self._thread:
@@ -40,27 +53,61 @@ class DataReceiver:
         return self._data
 
     def getJsonData(self):
-        flatData = dict(self._data['Motion'].__dict__)
-        flatData.update(self._data['Telemetry'].__dict__)
-
-        data = {key: value for key,value in flatData.items() if isinstance(value, int) or isinstance(value, float)}
+        return json.dumps(self.getFlatData())
 
-        for key, tupleValues in flatData.items():
-            if isinstance(tupleValues, tuple):
-                data[key] = list(tupleValues)
+    # all channels of the player car in one flat dictionary, the dictionary is reused.
+    # Records are updated in place by the receiver thread, a read during an update
+    # may mix values of two consecutive packets.
+    def getFlatData(self):
+        data = self._flatData
+        self._data['Motion'].writeTo(data)
+        self._data['Telemetry'].writeTo(data)
+        for _, _, filtered in self._filters.values():
+            data.update(filtered)
+        return data
 
-        return json.dumps(data)
+    # specs: [(channel, kind, param)], see telemetry_filters. Filters run once per received
+    # packet of the record holding the channel, the time step comes from the session time.
+    def setFilters(self, specs):
+        filters, known = {}, set()
+        for name, record in self._data.items():
+            recordSpecs = [spec for spec in specs if spec[0] in record.NAMES]
+            if recordSpecs:
+                filters[name] = (FilterStage(recordSpecs), {}, {})
+                known.update(spec[0] for spec in recordSpecs)
+        unknown = [spec[0] for spec in specs if spec[0] not in known]
+        if unknown:
+            raise ValueError('Cannot filter unknown channels: ' + ', '.join(unknown))
+        self._filters = filters
 
     def isConnected(self):
         return self._connected
 
+    def getStats(self):
+        stats = self._tracker.getStats()
+        stats['invalid'] = self._invalid
+        return stats
+
     def stop(self):
         self._running = False
         self._thread.join()
+        self._thread = None
 
     def register(self, callback):
         self._callback = callback
 
+    def _filter(self, header):
+        name = F12019Parser.ID_TO_NAME[header[0]]
+        if name not in self._filters:
+            return
+        stage, inputs, filtered = self._filters[name]
+        previous = inputs.get('sessionTime')
+        self._data[name].writeTo(inputs)
+        inputs['sessionTime'] = session_time = header[2]
+        stage.apply(inputs, session_time - previous if previous is not None else None)
+        for outName in stage.getOutputNames():
+            filtered[outName] = inputs[outName]
+
     def _runServer(self):
         try:
             #ip = '127.0.0.1'
@@ -74,12 +121,27 @@ class DataReceiver:
             sock.bind((ip, self._port))
             while self._running:
                 try:
-                    packet, addr = sock.recvfrom(3096)
-                    if packet == '':
+                    size = sock.recv_into(self._buffer)
+                    if size == 0:
                         raise RuntimeError("connection broken - header")
                     self._connected = True
-                    parsed = self._parser.parseMessage(packet)
-                    self._data.update(parsed)
+                    packet = self._views.get(size)
+                    if packet is None:
+                        packet = self._view[:size] # unknown size, rejected by parseHeader
+                    try:
+                        header = self._parser.parseHeader(packet)
+                    except ValueError:
+                        self._invalid += 1
+                        continue
+                    if not self._tracker.accept(header):
+                        continue # stale or reordered, keep the newer data
+                    restarts = self._tracker.sessionChanges + self._tracker.flashbacks
+                    if restarts != self._restarts:
+                        self._restarts = restarts
+                        for stage, _, _ in self._filters.values():
+                            stage.reset() # no smoothing across a restart
+                    if self._parser.updateData(self._data, packet, header):
+                        self._filter(header)
                     if self._callback:
                         self._callback(self._data)
                 except socket.timeout:
@@ -90,125 +152,234 @@ class DataReceiver:
             raise
         self._running = False
 
+# FRAME TRACKING ##################################################
+# Drops duplicated/reordered packets and estimates loss per packet type. The game sends
+# on a fixed rate but the frame identifier follows the render frame rate, so the frame
+# delta between two packets jitters (e.g. 1, 2, 2, 1, 2 at 100 fps / 60 Hz). Loss is
+# only counted for gaps well above the mean delta.
+class FrameTracker(object):
+    # frames going back within this session time are reordered packets, larger jumps are flashbacks
+    STALE_TIME_WINDOW = 0.1
+    LOSS_GAP_FACTOR = 1.5 # delta above this times the mean delta is a gap
+    MIN_STEPS = 8 # deltas needed for a mean delta before loss is counted
+    NUM_PACKET_IDS = 8
+
+    def __init__(self):
+        self._sessionUID = None
+        self.sessionChanges = 0
+        self.flashbacks = 0
+        self._reset()
+
+    def _reset(self):
+        count = FrameTracker.NUM_PACKET_IDS
+        self._resetFrames()
+        self._frameSpan = [0] * count # sum of frame deltas, mean delta = span / steps
+        self._steps = [0] * count
+        self._received = [0] * count
+        self._stale = [0] * count
+        self._lost = [0] * count
+
+    def _resetFrames(self):
+        count = FrameTracker.NUM_PACKET_IDS
+        self._lastFrame = [-1] * count
+        self._lastTime = [0.0] * count
+
+    # returns False for packets to ignore, sessionChanges/flashbacks count restarts of the data
+    def accept(self, header):
+        packet_id, session_uid, session_time, frame, _ = header
+        if session_uid != self._sessionUID:
+            self._sessionUID = session_uid
+            self.sessionChanges += 1
+            self._reset()
+
+        last = self._lastFrame[packet_id]
+        delta = frame - last
+        if last >= 0:
+            if delta <= 0:
+                if 0 <= self._lastTime[packet_id] - session_time < FrameTracker.STALE_TIME_WINDOW:
+                    self._stale[packet_id] += 1
+                    return False
+                # flashback or restart - all packet types continue from the earlier frame
+                self.flashbacks += 1
+                self._resetFrames()
+            else:
+                steps, lost = self._steps[packet_id], 0
+                if steps >= FrameTracker.MIN_STEPS:
+                    mean = float(self._frameSpan[packet_id]) / steps
+                    if delta > mean * FrameTracker.LOSS_GAP_FACTOR:
+                        lost = max(1, int(round(delta / mean)) - 1)
+                        self._lost[packet_id] += lost
+                # a gap counts as the packets it stands for, the mean stays the send interval
+                self._frameSpan[packet_id] += delta
+                self._steps[packet_id] = steps + lost + 1
+
+        self._lastFrame[packet_id] = frame
+        self._lastTime[packet_id] = session_time
+        self._received[packet_id] += 1
+        return True
+
+    def getStats(self):
+        stats = {'sessionChanges': self.sessionChanges, 'flashbacks': self.flashbacks}
+        for packet_id, name in F12019Parser.ID_TO_NAME.items():
+            received, lost = self._received[packet_id], self._lost[packet_id]
+            expected = received + lost
+            stats[name] = {'received': received,
+                           'stale': self._stale[packet_id],
+                           'lost': lost,
+                           'lossRate': float(lost) / expected if expected else 0.0}
+        return stats
+
+# RECORDS #########################################################
+# Records are created once and updated in place. Only the wanted car is unpacked, with
+# a per car struct at its offset in the packet, the player car only data with a second
+# struct. Fields are (name, index in the unpacked values, count) - count 0 for scalars,
+# compiled into one assignment function per table. writeTo() fills a reused flat
+# dictionary, lists are shared so only scalars are copied on each call.
+HEADER_LENGTH = loadLayout('f1_2019', 'PacketHeader').size
+NUM_CARS = 20
+
+def compileAssign(fields):
+    lines = ['def assign(self, v):']
+    for name, index, count in fields:
+        if count:
+            lines.append('    self.%s[:] = v[%d:%d]' % (name, index, index + count))
+        else:
+            lines.append('    self.%s = v[%d]' % (name, index))
+    namespace = {}
+    exec(compile('\n'.join(lines) + '\n', '<record %s>' % fields[0][0], 'exec'), namespace)
+    return namespace['assign']
+
+class Record(object):
+    __slots__ = ()
+
+    def _initFields(self, fields):
+        for name, _, count in fields:
+            setattr(self, name, [0] * count if count else 0)
+
+    def writeTo(self, out):
+        for name in self.__class__.NAMES:
+            out[name] = getattr(self, name)
+
 # MOTION DATA #####################################################
-class CarMotionData(object):
-    def __init__(self, args=(0,)*18):  
-        super(CarMotionData, self).__init__()
-        self.worldPositionX = args[0];      # World space X position
-        self.worldPositionY = args[1];      # World space Y position
-        self.worldPositionZ = args[2];      # World space Z position
-        self.worldVelocityX = args[3];      # Velocity in world space X
-        self.worldVelocityY = args[4];      # Velocity in world space Y
-        self.worldVelocityZ = args[5];      # Velocity in world space Z
-        self.worldForwardDirX = args[6];    # World space forward X direction (normalised)
-        self.worldForwardDirY = args[7];    # World space forward Y direction (normalised)
-        self.worldForwardDirZ = args[8];    # World space forward Z direction (normalised)
-        self.worldRightDirX = args[9];      # World space right X direction (normalised)
-        self.worldRightDirY = args[10];     # World space right Y direction (normalised)
-        self.worldRightDirZ = args[11];     # World space right Z direction (normalised)
-        self.gForceLateral = args[12];      # Lateral G-Force component
-        self.gForceLongitudinal = args[13]; # Longitudinal G-Force component
-        self.gForceVertical = args[14];     # Vertical G-Force component
-        self.yaw = args[15];                # Yaw angle in radians
-        self.pitch = args[16];              # Pitch angle in radians
-        self.roll = args[17];               # Roll angle in radians
-
-class ExtraMotionData(object):
-    def __init__(self, args=(0,)*30):
-        super(ExtraMotionData, self).__init__()
-        # Note: All wheel arrays have the following order: RL, RR, FL, FR
-        self.suspensionPosition = args[0], args[1], args[2], args[3];       
-        self.suspensionVelocity = args[4], args[5], args[6], args[7];       
-        self.suspensionAcceleration = args[8], args[9], args[10], args[11];
-        self.wheelSpeed = args[12], args[13], args[14], args[15];           # Speed of each wheel
-        self.wheelSlip = args[16], args[17], args[18], args[19];            # Slip ratio for each wheel
-        self.localVelocityX = args[20];       # Velocity in local space
-        self.localVelocityY = args[21];       # Velocity in local space
-        self.localVelocityZ = args[22];       # Velocity in local space
-        self.angularVelocityX = args[23];	   # Angular velocity x-component
-        self.angularVelocityY = args[24];     # Angular velocity y-component
-        self.angularVelocityZ = args[25];     # Angular velocity z-component
-        self.angularAccelerationX = args[26]; # Angular velocity x-component
-        self.angularAccelerationY = args[27]; # Angular velocity y-component
-        self.angularAccelerationZ = args[28]; # Angular velocity z-component
-        self.frontWheelsAngle = args[29];     # Current front wheels angle in radians
- 
-class Motion(CarMotionData, ExtraMotionData):
-    def __init__(self, args, player_id):
-        start, end = player_id*18, (player_id*18)+18
-        CarMotionData.__init__(self, args[start:end])
-        ExtraMotionData.__init__(self, args[20*18:]) # skip data for first 20 cars
-        #self.cars = [CarMotionData(args[x*18:(x*18)+18]) for x in range(20)] # 20 cars
+# field tables and structs come from layouts/f1_2019.json, see there for descriptions
+CAR_MOTION_FIELDS = tuple(getValueFields('f1_2019', 'CarMotionData'))
+CAR_MOTION_STRUCT = struct.Struct(loadLayout('f1_2019', 'CarMotionData').format)
+
+# Note: All wheel arrays have the following order: RL, RR, FL, FR
+PLAYER_MOTION_FIELDS = tuple(getValueFields('f1_2019', 'PlayerCarMotionData'))
+PLAYER_MOTION_STRUCT = struct.Struct(loadLayout('f1_2019', 'PlayerCarMotionData').format)
+PLAYER_MOTION_OFFSET = HEADER_LENGTH + loadLayout('f1_2019', 'PacketMotionData').offsets['playerCarMotionData']
+
+class CarMotionData(Record):
+    NAMES = tuple(x[0] for x in CAR_MOTION_FIELDS)
+    __slots__ = NAMES
+    _assignCar = compileAssign(CAR_MOTION_FIELDS)
+
+    def __init__(self):
+        self._initFields(CAR_MOTION_FIELDS)
+
+    def update(self, packet, car_index):
+        self._assignCar(CAR_MOTION_STRUCT.unpack_from(packet, HEADER_LENGTH + car_index * CAR_MOTION_STRUCT.size))
+
+class Motion(CarMotionData):
+    NAMES = CarMotionData.NAMES + tuple(x[0] for x in PLAYER_MOTION_FIELDS)
+    __slots__ = tuple(x[0] for x in PLAYER_MOTION_FIELDS)
+    _assignPlayer = compileAssign(PLAYER_MOTION_FIELDS)
+
+    def __init__(self):
+        CarMotionData.__init__(self)
+        self._initFields(PLAYER_MOTION_FIELDS)
+
+    def update(self, packet, player_id):
+        CarMotionData.update(self, packet, player_id)
+        self._assignPlayer(PLAYER_MOTION_STRUCT.unpack_from(packet, PLAYER_MOTION_OFFSET))
 
 # TELEMETRY DATA #####################################################
-class CarTelemetry(object):
-    def __init__(self, args=(0,)*30):
-        super(CarTelemetry, self).__init__()
-        self.speed = args[0]              # Speed of car in kilometres per hour
-        self.throttle = args[1]           # Amount of throttle applied (0.0 to 1.0)
-        self.steer = args[2]              # Steering (-1.0 (full lock left) to 1.0 (full lock right))
-        self.brake = args[3]              # Amount of brake applied (0.0 to 1.0)
-        self.clutch = args[4]             # Amount of clutch applied (0 to 100)
-        self.gear = args[5]               # Gear selected (1-8, N=0, R=-1)
-        self.engineRPM = args[6]          # Engine RPM
-        self.drs = args[7]                # 0 = off, 1 = on
-        self.revLightsPercent = args[8]   # Rev lights indicator (percentage)
-        self.brakesTemperature = args[9], args[10], args[11], args[12]        # Brakes temperature (celsius)
-        self.tyresSurfaceTemperature = args[13],args[14],args[15],args[16] # Tyres surface temperature (celsius)
-        self.tyresInnerTemperature = args[17],args[18],args[19],args[20]   # Tyres inner temperature (celsius)
-        self.engineTemperature = args[21]                                     # Engine temperature (celsius)
-        self.tyresPressure = args[22],args[23],args[24],args[25]            # Tyres pressure (PSI)
-        self.surfaceType = args[26],args[27],args[28],args[29]                # Driving surface, see appendices
+CAR_TELEMETRY_FIELDS = tuple(getValueFields('f1_2019', 'CarTelemetryData'))
+CAR_TELEMETRY_STRUCT = struct.Struct(loadLayout('f1_2019', 'CarTelemetryData').format)
+
+PLAYER_TELEMETRY_FIELDS = tuple(getValueFields('f1_2019', 'PlayerCarTelemetryData'))
+PLAYER_TELEMETRY_STRUCT = struct.Struct(loadLayout('f1_2019', 'PlayerCarTelemetryData').format)
+PLAYER_TELEMETRY_OFFSET = HEADER_LENGTH + loadLayout('f1_2019', 'PacketCarTelemetryData').offsets['playerCarTelemetryData']
+
+class CarTelemetry(Record):
+    NAMES = tuple(x[0] for x in CAR_TELEMETRY_FIELDS)
+    __slots__ = NAMES
+    _assignCar = compileAssign(CAR_TELEMETRY_FIELDS)
+
+    def __init__(self):
+        self._initFields(CAR_TELEMETRY_FIELDS)
+
+    def update(self, packet, car_index):
+        self._assignCar(CAR_TELEMETRY_STRUCT.unpack_from(packet, HEADER_LENGTH + car_index * CAR_TELEMETRY_STRUCT.size))
 
 class Telemetry(CarTelemetry):
-    def __init__(self, args, player_id):  
-        start, end = player_id*30, (player_id*31)+31
-        CarTelemetry.__init__(self, args[:30])
-        self.buttonStatus = args[-1] # pressed buttons
-        #self.cars = [CarTelemetry(args[x*30:(x*30)+30]) for x in range(20)] # 20 cars
+    NAMES = CarTelemetry.NAMES + tuple(x[0] for x in PLAYER_TELEMETRY_FIELDS)
+    __slots__ = tuple(x[0] for x in PLAYER_TELEMETRY_FIELDS)
+    _assignPlayer = compileAssign(PLAYER_TELEMETRY_FIELDS)
+
+    def __init__(self):
+        CarTelemetry.__init__(self)
+        self._initFields(PLAYER_TELEMETRY_FIELDS)
+
+    def update(self, packet, player_id):
+        CarTelemetry.update(self, packet, player_id)
+        self._assignPlayer(PLAYER_TELEMETRY_STRUCT.unpack_from(packet, PLAYER_TELEMETRY_OFFSET))
 
 
 # PARSER ##########################################################
 class F12019Parser(object):
-    HEADER_LENGTH = 23
-    HEADER_PATTERN = '<HBBBBQfIB'
+    # packet layouts are declared in layouts/f1_2019.json
+    HEADER_LENGTH = HEADER_LENGTH
+    HEADER_PATTERN = loadLayout('f1_2019', 'PacketHeader').format
+    HEADER_STRUCT = struct.Struct(HEADER_PATTERN)
 
-    CAR_MOTION_PATTERN = 'ffffffhhhhhhffffff'
-    CAR_TELEMETRY_PATTERN = 'HfffBbHBB' + ('H'*12) + 'HffffBBBB'
     PACKET_ID_TO_SIZE = {0: 1343, 1:149, 2:843, 3:32, 4:1104, 5:843, 6:1347, 7:1143}
 
-    ID_TO_PATTERN = {0: '<' + (20*CAR_MOTION_PATTERN) + (30*'f'),\
-                     6: '<' + (20*CAR_TELEMETRY_PATTERN) + 'I'}
+    # whole packet layouts, the records unpack only the player car
+    ID_TO_PATTERN = {0: loadLayout('f1_2019', 'PacketMotionData').format,\
+                     6: loadLayout('f1_2019', 'PacketCarTelemetryData').format}
     ID_TO_CLASS = {0: Motion, 6: Telemetry}
     ID_TO_NAME = {0:"Motion", 1:"Session", 2:"Lap Data", 3:"Event",\
                   4:"Participants", 5:"Car Setups", 6:"Telemetry", 7:"Car Status"}
 
-    def parseMessage(self, packet):
-        header = packet[:F12019Parser.HEADER_LENGTH]
-        packet_id, player_id = self._getMessageType(header)
-        assert len(packet) == F12019Parser.PACKET_ID_TO_SIZE[packet_id], "Packet size does not match the message"
-        if packet_id not in F12019Parser.ID_TO_PATTERN:
-            return {}        
-        unpack_pattern = F12019Parser.ID_TO_PATTERN[packet_id]
-        msg = packet[F12019Parser.HEADER_LENGTH:]        
-        parsed = struct.unpack(unpack_pattern, msg)    
-        message_name = F12019Parser.ID_TO_NAME[packet_id];
-        cls = F12019Parser.ID_TO_CLASS[packet_id];
-        return {message_name: cls(parsed, player_id)}       
-    
+    # returns new records, use updateData() to reuse the existing ones
+    def parseMessage(self, packet, header=None):
+        if header is None:
+            header = self.parseHeader(packet)
+        packet_id = header[0]
+        if packet_id not in F12019Parser.ID_TO_CLASS:
+            return {}
+        data = {F12019Parser.ID_TO_NAME[packet_id]: F12019Parser.ID_TO_CLASS[packet_id]()}
+        self.updateData(data, packet, header)
+        return data
+
+    # updates records of getEmptyData() in place, returns False for ignored packets
+    def updateData(self, data, packet, header):
+        packet_id, _, _, _, player_id = header
+        if packet_id not in F12019Parser.ID_TO_CLASS or player_id >= NUM_CARS:
+            return False # 255 = spectating, no player car
+        data[F12019Parser.ID_TO_NAME[packet_id]].update(packet, player_id)
+        return True
+
+    # returns (packet_id, session_uid, session_time, frame_identifier, player_id)
+    def parseHeader(self, packet):
+        if len(packet) < F12019Parser.HEADER_LENGTH:
+            raise ValueError('Packet too short: ' + str(len(packet)))
+        version, _, _, _, packet_id, session_uid, session_time, frame, player_id = \
+            F12019Parser.HEADER_STRUCT.unpack_from(packet)
+        if version != 2019:
+            raise ValueError('VERSION IS NOT 2019: ' + str(version))
+        if F12019Parser.PACKET_ID_TO_SIZE.get(packet_id) != len(packet):
+            raise ValueError('Packet size does not match the message')
+        return packet_id, session_uid, session_time, frame, player_id
+
     def getEmptyData(self):
         data = {}
         for packet_id, cls in F12019Parser.ID_TO_CLASS.items():
-            name = F12019Parser.ID_TO_NAME[packet_id]
-            num_fields = len(F12019Parser.ID_TO_PATTERN[packet_id])
-            data[name] = cls((0,)*num_fields, 0)            
+            data[F12019Parser.ID_TO_NAME[packet_id]] = cls()
         return data
 
-    def _getMessageType(self, header_data):
-        version, _, _, _, packet_id, _, _, _, player_id = struct.unpack(F12019Parser.HEADER_PATTERN, header_data)
-        assert version == 2019, 'VERSION IS NOT 2019: ' + str(version)
-        return packet_id, player_id        
-
 # EXAMPLE ######################################################################
 if __name__ == '__main__':
     receiver = DataReceiver(F12019Parser())
@@ -0,0 +1,157 @@
+import threading
+import socket
+import errno
+import time
+
+from f1_2019_telemetry_reader import F12019Parser
+
+PACKET_ID_OFFSET = 5 # m_packetId position inside PacketHeader
+RECV_BUFFER_SIZE = 3096
+# refused endpoint: ECONNREFUSED on posix, WSAECONNRESET on windows
+UNREACHABLE_ERRNOS = frozenset(x for x in (errno.ECONNREFUSED, errno.ECONNRESET,
+                                           getattr(errno, 'WSAECONNREFUSED', None),
+                                           getattr(errno, 'WSAECONNRESET', None)) if x is not None)
+
+# SUBSCRIBER ##########################################
+# Counters only cover what the sender can see: `dropped` - local send buffer full,
+# `unreachable` - nobody listening on the endpoint. The system reports a refused datagram
+# on the following send, so that send moves the previous datagram from `forwarded` to
+# `unreachable`; the last datagram before the endpoint went away may still be counted
+# as forwarded. Datagrams a slow consumer does not read in time are discarded on its
+# receive side without any error here, consumers detect those gaps from the F1 frame identifiers.
+class RelaySubscriber(object):
+    def __init__(self, address, packet_ids=None):
+        self.address = address
+        self.forwarded = 0
+        self.dropped = 0
+        self.unreachable = 0
+        self._lastForwarded = False
+        # lookup table indexed by packet id, avoids set/hash work per packet
+        self._accepts = bytearray(256)
+        for packet_id in (range(256) if packet_ids is None else packet_ids):
+            self._accepts[packet_id] = 1
+        # connected socket - no address conversion on each send
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+        self._sock.connect(address)
+
+    def forward(self, packet_id, packet):
+        if not self._accepts[packet_id]:
+            return
+        try:
+            self._sock.send(packet)
+            self.forwarded += 1
+            self._lastForwarded = True
+        except socket.error as e:
+            if e.errno in UNREACHABLE_ERRNOS:
+                # the error belongs to the previous datagram, this one is not sent either
+                if self._lastForwarded:
+                    self.forwarded -= 1
+                    self.unreachable += 1
+                self.unreachable += 1
+            else:
+                self.dropped += 1
+            self._lastForwarded = False
+
+    def close(self):
+        self._sock.close()
+
+# UDP RELAY ##########################################
+class DataRelay(object):
+    def __init__(self, subscribers, port=20789):
+        self._running = False
+        self._thread = None
+        self._port = port
+        self._subscribers = list(subscribers)
+        self._received = 0
+        # preallocated receive buffer and views for every known packet size
+        self._buffer = bytearray(RECV_BUFFER_SIZE)
+        view = memoryview(self._buffer)
+        self._views = dict((size, view[:size]) for size in F12019Parser.PACKET_ID_TO_SIZE.values())
+        self._view = view
+
+    def start(self):
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._runServer)
+        self._thread.daemon = True
+        self._running = True
+        self._thread.start()
+
+    def isRunning(self):
+        return self._running
+
+    def getStats(self):
+        return {'received': self._received,
+                'subscribers': [{'address': '%s:%d' % sub.address,
+                                 'forwarded': sub.forwarded,
+                                 'dropped': sub.dropped,
+                                 'unreachable': sub.unreachable} for sub in self._subscribers]}
+
+    def stop(self):
+        self._running = False
+        self._thread.join()
+        self._thread = None
+
+    # subscribers stay open between stop() and start(), close them when done with the relay
+    def close(self):
+        if self._thread:
+            self.stop()
+        for sub in self._subscribers:
+            sub.close()
+
+    def _runServer(self):
+        try:
+            ip = '0.0.0.0' # broadcast
+            print("Relaying " + ip + ":" + str(self._port))
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.settimeout(0.2)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            if hasattr(socket, 'SO_EXCLUSIVEADDRUSE'):
+                # windows - make sure no other consumer can steal the game port
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_EXCLUSIVEADDRUSE, 1)
+            sock.bind((ip, self._port))
+            buff, views, subscribers = self._buffer, self._views, self._subscribers
+            while self._running:
+                try:
+                    size = sock.recv_into(buff)
+                except socket.timeout:
+                    continue
+                if size <= PACKET_ID_OFFSET:
+                    continue
+                packet = views.get(size)
+                if packet is None:
+                    packet = self._view[:size] # unknown packet size, rare
+                packet_id = buff[PACKET_ID_OFFSET]
+                self._received += 1
+                for sub in subscribers:
+                    sub.forward(packet_id, packet)
+            sock.close()
+        except Exception:
+            self._running = False
+            raise
+        self._running = False
+
+
+def parseEndpoint(endpoint):
+    # host:port[:packet_id,packet_id...]
+    parts = endpoint.split(':')
+    packet_ids = [int(x) for x in parts[2].split(',')] if len(parts) > 2 else None
+    return RelaySubscriber((parts[0], int(parts[1])), packet_ids)
+
+# EXAMPLE ######################################################################
+if __name__ == '__main__':
+    import argparse
+    argParser = argparse.ArgumentParser(description='Forward F1 2019 telemetry to local consumers')
+    argParser.add_argument('endpoints', nargs='+', help='host:port[:packet_ids], e.g. 127.0.0.1:20790:0,6')
+    argParser.add_argument('--port', type=int, default=20789, help='game telemetry port')
+    args = argParser.parse_args()
+
+    relay = DataRelay([parseEndpoint(x) for x in args.endpoints], args.port)
+    relay.start()
+    try:
+        while relay.isRunning():
+            print(relay.getStats())
+            time.sleep(1)
+    finally:
+        relay.close()
@@ -0,0 +1,196 @@
+import threading
+import socket
+import struct
+import mmap
+import time
+import ctypes
+
+# Detects the running simulator without loading any game reader module.
+# Every probe runs in its own background thread and only updates its `live` flag,
+# getDetectedGame() just reads the flags. Game ids match `game_id` of qml/games readers.
+
+FILE_MAP_READ = 0x0004
+F1_2019_PORT = 20789
+BIND_RETRY_MAX = 30.0 # seconds between bind attempts while the port is taken
+UDP_RECV_SIZE = 2048 # whole datagram, oversized reads fail on windows (WSAEMSGSIZE)
+UDP_PACKET_FORMATS = {'f1_2019': 2019} # PacketHeader.m_packetFormat
+
+
+# SHARED MEMORY PROBE ##########################################
+class SharedMemoryProbe(object):
+    def __init__(self, game_id, tag_name, counter_offset, interval=0.5):
+        self.game_id = game_id
+        self.live = False
+        self.interval = interval
+        self._tagName = tag_name
+        self._counterOffset = counter_offset
+        self._lastCounter = None
+
+    def run(self, detector):
+        while detector.isRunning():
+            counter = self._readCounter()
+            # live only when the game keeps updating the segment, not paused/closed
+            self.live = counter is not None and self._lastCounter is not None and counter != self._lastCounter
+            self._lastCounter = counter
+            time.sleep(self.interval)
+
+    def _readCounter(self):
+        if not self._exists():
+            return None
+        # mapping exists, mmap only opens it - read just the counter
+        size = self._counterOffset + 4
+        shm = mmap.mmap(-1, size, self._tagName, access=mmap.ACCESS_READ)
+        try:
+            return struct.unpack_from('<i', shm, self._counterOffset)[0]
+        finally:
+            shm.close()
+
+    def _exists(self):
+        # mmap would create a missing segment, ask the system without creating it
+        if not hasattr(ctypes, 'windll'):
+            return False # named shared memory is windows only
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenFileMappingW(FILE_MAP_READ, False, u'' + self._tagName)
+        if not handle:
+            return False
+        kernel32.CloseHandle(handle)
+        return True
+
+
+# UDP PROBE ##########################################
+class UdpProbe(object):
+    def __init__(self, game_id, port, packet_format, timeout=2.0):
+        self.game_id = game_id
+        self.live = False
+        self._port = port
+        self._packetFormat = packet_format
+        self._timeout = timeout
+        self._paused = False
+        self._released = threading.Event() # set while paused and the port is closed
+        self._lastSeen = 0
+        self._retryDelay = 0.5
+        self._buffer = bytearray(UDP_RECV_SIZE)
+
+    def run(self, detector):
+        sock = None
+        retryTime = 0
+        while detector.isRunning():
+            if self._paused:
+                # the game reader owns the port now
+                if sock:
+                    sock.close()
+                    sock = None
+                self.live = False
+                self._released.set()
+                time.sleep(0.2)
+                continue
+            if not sock:
+                if time.time() < retryTime:
+                    self.live = False
+                    time.sleep(0.5)
+                    continue
+                try:
+                    sock = self._bind()
+                    self._retryDelay = 0.5
+                except socket.error:
+                    # port owned by another program (e.g. the UDP relay), try again later
+                    retryTime = time.time() + self._retryDelay
+                    self._retryDelay = min(self._retryDelay * 2, BIND_RETRY_MAX)
+                    continue
+            try:
+                size = sock.recv_into(self._buffer)
+                if size > 2 and struct.unpack_from('<H', self._buffer)[0] == self._packetFormat:
+                    self._lastSeen = time.time()
+            except socket.timeout:
+                pass
+            except socket.error:
+                pass # e.g. ICMP errors of earlier datagrams, keep probing
+            self.live = time.time() - self._lastSeen < self._timeout
+        if sock:
+            sock.close()
+
+    # wait: block until the probe thread closed the port, so the game reader can bind it
+    def setPaused(self, paused, wait=False):
+        if paused and not self._paused:
+            self._released.clear()
+        self._paused = paused
+        if paused and wait:
+            self._released.wait(1.0)
+
+    def _bind(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.settimeout(0.2)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(('0.0.0.0', self._port))
+        except socket.error:
+            sock.close()
+            raise
+        return sock
+
+
+# udp_ports: game id -> port to probe, games missing or with port 0 are not probed.
+# A UDP probe binds the port, which takes datagrams from other tools on it - the HUD
+# passes the `detect_udp_port` of its game readers (off for relay endpoints).
+def defaultProbes(udp_ports=None):
+    if udp_ports is None:
+        udp_ports = {'f1_2019': F1_2019_PORT}
+    probes = [SharedMemoryProbe('assetto_corsa', 'Local\\acpmf_physics', 0),   # SPageFilePhysics.packetId
+              SharedMemoryProbe('raceroom', '$R3E', 36)]                      # r3e_shared.player.game_simulation_ticks
+    for game_id, port in sorted(udp_ports.items()):
+        if port and game_id in UDP_PACKET_FORMATS:
+            probes.append(UdpProbe(game_id, port, UDP_PACKET_FORMATS[game_id]))
+    return probes
+
+
+# DETECTOR ##########################################
+class GameDetector(object):
+    def __init__(self, probes=None):
+        self._probes = probes if probes is not None else defaultProbes()
+        self._threads = []
+        self._running = False
+        self._active = ''
+
+    def start(self):
+        if self._threads:
+            return
+        self._running = True
+        for probe in self._probes:
+            thread = threading.Thread(target=probe.run, args=(self,))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def isRunning(self):
+        return self._running
+
+    # game reader started by the HUD - its source is not probed while it runs.
+    # Call before starting the reader, a paused UDP probe has released its port on return.
+    def setActive(self, game_id):
+        self._active = game_id
+        for probe in self._probes:
+            if isinstance(probe, UdpProbe):
+                probe.setPaused(probe.game_id == game_id, wait=self._running)
+
+    # returns the game that should run or '' when there is nothing to change
+    def getDetectedGame(self):
+        live = [probe.game_id for probe in self._probes if probe.live]
+        if self._active in live:
+            return self._active
+        return live[0] if live else ''
+
+    def stop(self):
+        self._running = False
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+
+# EXAMPLE ######################################################################
+if __name__ == '__main__':
+    detector = GameDetector()
+    detector.start()
+    while True:
+        print('Detected game: ' + (detector.getDetectedGame() or '-'))
+        time.sleep(1)
@@ -0,0 +1,264 @@
+import os
+import sys
+import json
+import struct
+import hashlib
+
+# Compiles declarative layout specs (scripts/layouts/*.json) into decoders.
+#
+# A spec describes the root structure in "fields" and named sub structures in "structs":
+#   {"byte_order": "<",
+#    "structs": {"vec3": [{"fmt": "f", "name": "x"}, ...]},
+#    "fields": [
+#       {"fmt": "i", "name": "gear", "description": "Current gear"},
+#       {"fmt": "f", "name": "wheelSlip", "count": 4},              - list of values
+#       {"fmt": "s", "name": "track_name", "count": 64},            - NUL terminated string
+#       {"struct": "vec3", "name": "position"},                     - fields merged into the parent
+#       {"struct": "vec3", "name": "wheels", "count": 4},           - list of dictionaries
+#       {"fmt": "f", "name": "kersCharge", "available": false}]}   - skipped, not even unpacked
+#
+# The generated decoder unpacks the whole layout with one precompiled struct and builds
+# the result from a single dictionary literal. Generated sources are cached next to the
+# specs, so only the first start after a spec change pays for the generation.
+
+LAYOUTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'layouts')
+CACHE_DIR = os.path.join(LAYOUTS_DIR, '__layoutcache__')
+COMPILER_VERSION = 1
+ROOT = 'root'
+INLINE_ARRAY_LIMIT = 16 # longer arrays are sliced instead of listed element by element
+
+_loaded = {}
+_specs = {}
+
+
+class CompiledLayout(object):
+    def __init__(self, namespace):
+        self.format = namespace['FORMAT']
+        self.size = namespace['SIZE']
+        self.offsets = namespace['OFFSETS']
+        self.decode = namespace['decode']
+
+
+def loadLayout(spec_name, struct_name=ROOT):
+    # compiled layouts are shared by all readers and sessions of the process
+    key = (spec_name, struct_name)
+    if key not in _loaded:
+        _loaded[key] = CompiledLayout(_loadNamespace(spec_name, struct_name))
+    return _loaded[key]
+
+
+def getValueFields(spec_name, struct_name=ROOT):
+    # (name, index in the unpacked values, count) of the scalar and array fields of a struct,
+    # count is 0 for scalars. Nested structs and unavailable fields take no entry, nested
+    # structs still advance the index. Used by readers that unpack with layout.format.
+    spec = _loadSpec(spec_name)
+    structs = spec.get('structs', {})
+    fields = spec['fields'] if struct_name == ROOT else structs[struct_name]
+    result = []
+    index = 0
+    for field in fields:
+        count = field.get('count', 0)
+        if not field.get('available', True):
+            continue
+        if 'struct' in field:
+            index += _valueCount(structs, structs[field['struct']]) * max(1, count)
+            continue
+        if field['fmt'] == 's':
+            count = 0 # one bytes value
+        result.append((str(field['name']), index, count))
+        index += max(1, count)
+    return result
+
+
+def _valueCount(structs, fields):
+    total = 0
+    for field in fields:
+        if not field.get('available', True):
+            continue
+        count = max(1, field.get('count', 0))
+        if 'struct' in field:
+            total += _valueCount(structs, structs[field['struct']]) * count
+        elif field['fmt'] == 's':
+            total += 1
+        else:
+            total += count
+    return total
+
+
+def compileSpec(spec, struct_name=ROOT, source_name='<spec>', digest=''):
+    byte_order = spec.get('byte_order', '<')
+    structs = spec.get('structs', {})
+    fields = spec['fields'] if struct_name == ROOT else structs[struct_name]
+
+    generator = _Generator(byte_order, structs)
+    entries, offsets = generator.emit(fields)
+    fmt = byte_order + ''.join(generator.fmt)
+
+    lines = ['# Generated by layout_compiler.py from %s, do not edit' % source_name,
+             '# digest: %s' % digest,
+             'import struct',
+             '',
+             'FORMAT = %r' % str(fmt),
+             'SIZE = %d' % struct.calcsize(fmt),
+             'OFFSETS = {%s}' % ', '.join('%r: %d' % (str(name), offset) for name, offset in offsets),
+             '_unpack_from = struct.Struct(FORMAT).unpack_from',
+             '',
+             'def decode(buffer, offset=0):',
+             '    v = _unpack_from(buffer, offset)',
+             '    return ' + _dictLiteral(entries, '            ')]
+    return '\n'.join(lines) + '\n'
+
+
+class _Generator(object):
+    def __init__(self, byte_order, structs):
+        self.byteOrder = byte_order
+        self.structs = structs
+        self.fmt = []
+        self.index = 0 # position in the unpacked tuple
+        self.offset = 0 # byte offset, all layouts are packed
+
+    def emit(self, fields):
+        entries, offsets = [], []
+        for field in fields:
+            offsets.append((field['name'], self.offset))
+            count = field.get('count', 0)
+            if 'struct' in field:
+                sub = self.structs[field['struct']]
+                if not field.get('available', True):
+                    self._skip(self._structSize(sub) * max(1, count))
+                elif not count:
+                    entries.extend(self.emit(sub)[0])
+                else:
+                    items = [_dictLiteral(self.emit(sub)[0]) for _ in range(count)]
+                    entries.append((field['name'], '[' + ', '.join(items) + ']'))
+                continue
+
+            fmt = field['fmt']
+            size = struct.calcsize(self.byteOrder + fmt) * max(1, count)
+            if not field.get('available', True):
+                self._skip(size)
+                continue
+            if fmt == 's':
+                self.fmt.append('%ds' % count)
+                entries.append((field['name'], "v[%d].split(b'\\0', 1)[0]" % self.index))
+                self.index += 1
+            elif count:
+                self.fmt.append('%d%s' % (count, fmt))
+                if count <= INLINE_ARRAY_LIMIT:
+                    value = '[' + ', '.join('v[%d]' % (self.index + i) for i in range(count)) + ']'
+                else:
+                    value = 'list(v[%d:%d])' % (self.index, self.index + count)
+                entries.append((field['name'], value))
+                self.index += count
+            else:
+                self.fmt.append(fmt)
+                entries.append((field['name'], 'v[%d]' % self.index))
+                self.index += 1
+            self.offset += size
+        return entries, offsets
+
+    def _skip(self, size):
+        self.fmt.append('%dx' % size)
+        self.offset += size
+
+    def _structSize(self, fields):
+        generator = _Generator(self.byteOrder, self.structs)
+        generator.emit(fields)
+        return struct.calcsize(self.byteOrder + ''.join(generator.fmt))
+
+
+def _dictLiteral(entries, indent=''):
+    # merged sub structures may repeat a name, the last one wins (same as dict.update)
+    last = dict((name, i) for i, (name, _) in enumerate(entries))
+    items = ['%r: %s' % (str(name), value) for i, (name, value) in enumerate(entries) if last[name] == i]
+    if indent:
+        return '{\n' + ''.join(indent + '    ' + x + ',\n' for x in items) + indent + '}'
+    return '{' + ', '.join(items) + '}'
+
+
+def _loadSpec(spec_name):
+    if spec_name not in _specs:
+        with open(os.path.join(LAYOUTS_DIR, spec_name + '.json'), 'rb') as f:
+            _specs[spec_name] = json.loads(f.read().decode('utf-8'))
+    return _specs[spec_name]
+
+
+def _loadNamespace(spec_name, struct_name):
+    spec_path = os.path.join(LAYOUTS_DIR, spec_name + '.json')
+    with open(spec_path, 'rb') as f:
+        raw = f.read()
+    digest = hashlib.sha1(raw + str(COMPILER_VERSION).encode('ascii')).hexdigest()
+    cache_path = os.path.join(CACHE_DIR, '%s.%s.py' % (spec_name, struct_name))
+
+    source = _readCache(cache_path, digest)
+    if source is not None:
+        try:
+            return _execSource(source, cache_path)
+        except Exception:
+            pass # damaged cache file, generate it again
+
+    spec = json.loads(raw.decode('utf-8'))
+    source = compileSpec(spec, struct_name, os.path.basename(spec_path), digest)
+    _writeCache(cache_path, source)
+    return _execSource(source, cache_path)
+
+
+def _execSource(source, cache_path):
+    namespace = {}
+    exec(compile(source, cache_path, 'exec'), namespace)
+    return namespace
+
+
+def _readCache(cache_path, digest):
+    try:
+        with open(cache_path, 'r') as f:
+            source = f.read()
+    except (IOError, OSError):
+        return None
+    lines = source.split('\n', 2)
+    if len(lines) < 2 or lines[1] != '# digest: ' + digest:
+        return None # spec or compiler changed
+    return source
+
+
+def _writeCache(cache_path, source):
+    # written next to the target and renamed, readers never see a partially written file
+    tmp_path = '%s.%d.tmp' % (cache_path, os.getpid())
+    try:
+        if not os.path.isdir(CACHE_DIR):
+            os.makedirs(CACHE_DIR)
+        with open(tmp_path, 'w') as f:
+            f.write(source)
+        _replaceFile(tmp_path, cache_path)
+    except (IOError, OSError):
+        # read only install or another process is writing it, generate again on the next start
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def _replaceFile(src, dst):
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+        return
+    # python 2: rename replaces atomically on posix, windows needs the target removed first
+    if os.name == 'nt' and os.path.exists(dst):
+        os.remove(dst)
+    os.rename(src, dst)
+
+
+# BUILD ######################################################################
+if __name__ == '__main__':
+    # precompile all specs: python layout_compiler.py
+    for name in sorted(os.listdir(LAYOUTS_DIR)):
+        if not name.endswith('.json'):
+            continue
+        spec_name = name[:-len('.json')]
+        with open(os.path.join(LAYOUTS_DIR, name), 'rb') as f:
+            spec = json.loads(f.read().decode('utf-8'))
+        for struct_name in [ROOT] + sorted(spec.get('structs', {})):
+            if struct_name == ROOT and 'fields' not in spec:
+                continue
+            layout = loadLayout(spec_name, struct_name)
+            sys.stdout.write('%s.%s: %d bytes\n' % (spec_name, struct_name, layout.size))
@@ -0,0 +1,159 @@
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+
+# Smoothing stage for noisy channels, filtered values are added next to the raw ones
+# as <channel>Filtered. Specs are (channel, kind, param) tuples:
+#   ('wheelSlip', 'ema', 0.2)          - exponential moving average, param is alpha (0.0 to 1.0)
+#   ('gForceLateral', 'lowpass', 5.0)  - one-pole low-pass, param is cutoff frequency in Hz
+#   ('accG', 'median', 5)              - median of last N samples
+# Channels can be scalars or lists (all wheel / vector channels). The low-pass alpha is
+# derived from sample_rate, or from the time step passed to apply() for irregular sources.
+# EMA and low-pass cost O(1) per sample. The median keeps every window sorted, a sample
+# costs a binary search plus shifting the entries between the dropped and the new value.
+
+FILTER_SUFFIX = 'Filtered'
+FILTER_KINDS = ('ema', 'lowpass', 'median')
+
+
+class FilterStage(object):
+    def __init__(self, specs, sample_rate=60.0):
+        for channel, kind, param in specs:
+            if kind not in FILTER_KINDS:
+                raise ValueError('Unknown filter kind for ' + channel + ': ' + str(kind))
+            if kind == 'ema' and not 0.0 < param <= 1.0:
+                raise ValueError('EMA alpha of ' + channel + ' must be in (0.0, 1.0]: ' + str(param))
+            if kind == 'lowpass' and not param > 0.0:
+                raise ValueError('Low-pass cutoff of ' + channel + ' must be positive: ' + str(param))
+            if kind == 'median' and not int(param) >= 1:
+                raise ValueError('Median size of ' + channel + ' must be at least 1: ' + str(param))
+        if not sample_rate > 0.0:
+            raise ValueError('Sample rate must be positive: ' + str(sample_rate))
+        self._specs = list(specs)
+        self._sampleRate = float(sample_rate)
+        self._dt = 1.0 / self._sampleRate
+        self._built = False
+
+    def getOutputNames(self):
+        return [channel + FILTER_SUFFIX for channel, _, _ in self._specs]
+
+    def reset(self):
+        # layout is rebuilt and state primed again from the next sample
+        self._built = False
+
+    # dt: seconds since the previous sample, None for the configured sample rate,
+    # 0 when the source has no new sample - the last outputs are repeated, no state changes
+    def apply(self, data, dt=None):
+        if dt == 0 and self._built:
+            data.update(self._outputs)
+            return data
+        if not self._built:
+            self._build(data)
+        if dt is not None and dt > 0.0 and dt != self._dt:
+            self._setTimeStep(dt)
+        outputs = self._outputs
+
+        # gather inputs of all smoothed channels into one flat array
+        inputs = self._inputs
+        for channel, offset, width, _ in self._smoothChannels:
+            value = data[channel]
+            if width:
+                for i in range(width):
+                    inputs[offset + i] = value[i]
+            else:
+                inputs[offset] = value
+
+        # one pass over all elements, y += alpha * (x - y)
+        state, alphas = self._state, self._alphas
+        for i in range(len(state)):
+            state[i] += alphas[i] * (inputs[i] - state[i])
+
+        for channel, offset, width, outName in self._smoothChannels:
+            outputs[outName] = state[offset:offset + width].tolist() if width else state[offset]
+
+        # history is the ring of every window in arrival order, windows the same values sorted
+        history, windows = self._history, self._windows
+        for index, (channel, offset, width, size, outName) in enumerate(self._medianChannels):
+            value = data[channel]
+            pos = self._medianPos[index]
+            self._medianPos[index] = (pos + 1) % size
+            middle = size // 2
+            if width:
+                out = []
+                for i in range(width):
+                    base = offset + i * size
+                    _replaceSorted(windows, base, base + size, history[base + pos], value[i])
+                    history[base + pos] = value[i]
+                    out.append(windows[base + middle])
+                outputs[outName] = out
+            else:
+                _replaceSorted(windows, offset, offset + size, history[offset + pos], value)
+                history[offset + pos] = value
+                outputs[outName] = windows[offset + middle]
+
+        data.update(outputs)
+        return data
+
+    def _build(self, data):
+        self._smoothChannels = []
+        self._medianChannels = []
+        self._lowpass = [] # (offset, count, rc) - alphas depending on the time step
+        alphas, initial, history = array('d'), array('d'), array('d')
+
+        for channel, kind, param in self._specs:
+            if channel not in data:
+                raise ValueError('Cannot filter unknown channel: ' + channel)
+            value = data[channel]
+            width = len(value) if isinstance(value, (list, tuple)) else 0
+            values = list(value) if width else [value]
+            outName = channel + FILTER_SUFFIX
+
+            if kind == 'median':
+                size = int(param)
+                self._medianChannels.append((channel, len(history), width, size, outName))
+                for x in values:
+                    history.extend([float(x)] * size)
+                continue
+
+            if kind == 'ema':
+                alpha = float(param)
+            else:
+                rc = 1.0 / (2 * math.pi * param)
+                self._lowpass.append((len(alphas), len(values), rc))
+                alpha = self._dt / (rc + self._dt)
+            self._smoothChannels.append((channel, len(alphas), width, outName))
+            alphas.extend([alpha] * len(values))
+            initial.extend([float(x) for x in values])
+
+        self._alphas = alphas
+        self._state = initial  # primed with the first sample, no ramp up from zero
+        self._inputs = array('d', initial)
+        self._history = history
+        self._windows = array('d', history) # windows start with one repeated value, already sorted
+        self._outputs = {}
+        self._medianPos = [0] * len(self._medianChannels)
+        self._built = True
+
+    def _setTimeStep(self, dt):
+        self._dt = dt
+        alphas = self._alphas
+        for offset, count, rc in self._lowpass:
+            alpha = dt / (rc + dt)
+            for i in range(offset, offset + count):
+                alphas[i] = alpha
+
+
+def _replaceSorted(window, lo, hi, old, new):
+    # replaces old by new in the sorted window[lo:hi], shifting the entries in between
+    i = bisect_left(window, old, lo, hi)
+    if new > old:
+        j = bisect_right(window, new, lo, hi) - 1
+        while i < j:
+            window[i] = window[i + 1]
+            i += 1
+    else:
+        j = bisect_left(window, new, lo, hi)
+        while i > j:
+            window[i] = window[i - 1]
+            i -= 1
+    window[i] = new
@@ -0,0 +1,232 @@
+import sys
+import math
+import numbers
+import select
+import socket
+import json
+import time
+
+# Headless telemetry server - runs one game reader without Qt and streams its frames
+# to local clients over TCP, so overlays and tools share a single decoder.
+#
+# Protocol, newline delimited JSON in both directions:
+#   client -> server: {"subscribe": ["speed", "wheelSlip"], "rate": 30, "batch": 4}
+#                     all keys optional: no subscribe = all channels, rate in frames per second
+#                     (0 = every frame), batch = frames per message. Can be sent again at any time.
+#   server -> client: [{"time": 12.5, "speed": 154.2, ...}, ...] - one list of `batch` frames per line
+
+MAX_CLIENT_BACKLOG = 1024 * 1024 # bytes queued for a client before its frames are dropped
+MAX_REQUEST_SIZE = 64 * 1024 # a request line longer than this disconnects the client
+MAX_BATCH = 1000
+MAX_RATE = 1000.0
+
+
+def createReader(game):
+    # readers are imported on demand, only the selected one is loaded
+    if game == 'f1_2019':
+        import f1_2019_telemetry_reader
+        return f1_2019_telemetry_reader.DataReceiver(f1_2019_telemetry_reader.F12019Parser())
+    if game == 'assetto_corsa':
+        if sys.version_info[0] >= 3:
+            import assetto_corsa_telemetry_reader_py3 as assetto_corsa_telemetry_reader
+        else:
+            import assetto_corsa_telemetry_reader
+        return assetto_corsa_telemetry_reader.AssettoCorsaData()
+    if game == 'raceroom':
+        import raceroom_telemetry_reader
+        return raceroom_telemetry_reader.RaceRoomData()
+    raise ValueError('Unknown game: ' + game)
+
+
+# CLIENT ##########################################
+class StreamClient(object):
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.channels = None # None = all channels
+        self.interval = 0.0
+        self.batch = 1
+        self.dropped = 0
+        self._nextFrameTime = 0.0
+        self._pending = []
+        self._pendingSize = 0
+        self._inbuf = b''
+        self.outbuf = bytearray()
+
+    def onReceive(self, chunk):
+        self._inbuf += chunk
+        while b'\n' in self._inbuf:
+            line, self._inbuf = self._inbuf.split(b'\n', 1)
+            if line.strip():
+                self._configure(json.loads(line.decode('utf-8')))
+        if len(self._inbuf) > MAX_REQUEST_SIZE:
+            raise ValueError('Request too long')
+
+    def _configure(self, request):
+        if not isinstance(request, dict):
+            raise ValueError('Request must be an object')
+        if 'subscribe' in request:
+            channels = request['subscribe']
+            if channels is not None and not (isinstance(channels, list) and
+                                             all(isinstance(x, type(u'')) for x in channels)):
+                raise ValueError('subscribe must be a list of channel names')
+            self.channels = tuple(sorted(channels)) if channels else None
+        if 'rate' in request:
+            rate = _number(request['rate'], 'rate')
+            if not 0.0 <= rate <= MAX_RATE:
+                raise ValueError('rate must be within 0 and %d' % MAX_RATE)
+            self.interval = 1.0 / rate if rate > 0 else 0.0
+        if 'batch' in request:
+            batch = _number(request['batch'], 'batch')
+            if not 1 <= batch <= MAX_BATCH:
+                raise ValueError('batch must be within 1 and %d' % MAX_BATCH)
+            self.batch = int(batch)
+        self._pending = []
+        self._pendingSize = 0
+
+    def wantsFrame(self, now):
+        if now < self._nextFrameTime:
+            return False
+        self._nextFrameTime = now + self.interval
+        return True
+
+    def push(self, serializedFrame):
+        if len(self.outbuf) + self._pendingSize > MAX_CLIENT_BACKLOG:
+            self.dropped += 1 # client does not read fast enough
+            return
+        self._pending.append(serializedFrame)
+        self._pendingSize += len(serializedFrame)
+        if len(self._pending) >= self.batch:
+            message = '[' + ','.join(self._pending) + ']\n'
+            self.outbuf += message.encode('utf-8')
+            self._pending = []
+            self._pendingSize = 0
+
+
+def _number(value, name):
+    # bool is a number too, nan/inf come from json literals like 1e999
+    if isinstance(value, bool) or not isinstance(value, numbers.Real):
+        raise ValueError(name + ' must be a number')
+    if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+        raise ValueError(name + ' must be finite')
+    return value
+
+
+# SERVER ##########################################
+class TelemetryServer(object):
+    def __init__(self, reader, host='127.0.0.1', port=20800, poll_rate=60.0):
+        self._reader = reader
+        self._getFrame = getattr(reader, 'getFlatData', None) or reader.getData
+        self._address = (host, port)
+        self._pollInterval = 1.0 / poll_rate
+        self._clients = {}
+        self._running = False
+
+    def serveForever(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind(self._address)
+        listener.listen(16)
+        listener.setblocking(False)
+        print('Serving telemetry on %s:%d' % self._address)
+
+        self._reader.start()
+        self._running = True
+        nextPoll = time.time()
+        try:
+            while self._running:
+                timeout = max(0.0, nextPoll - time.time())
+                writers = [c.sock for c in self._clients.values() if c.outbuf]
+                readable, writable, _ = select.select([listener] + list(self._clients), writers, [], timeout)
+                for sock in readable:
+                    if sock is listener:
+                        self._accept(listener)
+                    else:
+                        self._read(sock)
+                for sock in writable:
+                    if sock in self._clients:
+                        self._write(sock)
+                now = time.time()
+                if now >= nextPoll:
+                    self._broadcast(now)
+                    nextPoll = max(nextPoll + self._pollInterval, now)
+        finally:
+            for sock in list(self._clients):
+                self._disconnect(sock)
+            listener.close()
+            self._reader.stop()
+
+    def stop(self):
+        self._running = False
+
+    def getStats(self):
+        return [{'address': '%s:%d' % c.address, 'dropped': c.dropped} for c in self._clients.values()]
+
+    def _broadcast(self, now):
+        if not self._clients:
+            return
+        frame = dict(self._getFrame()) # readers may reuse their dictionary
+        frame['time'] = now
+        serialized = {} # each distinct subscription is serialized once per frame
+        for client in self._clients.values():
+            if not client.wantsFrame(now):
+                continue
+            key = client.channels
+            if key not in serialized:
+                if key is None:
+                    serialized[key] = json.dumps(frame)
+                else:
+                    serialized[key] = json.dumps(dict((name, frame[name]) for name in key + ('time',) if name in frame))
+            client.push(serialized[key])
+
+    def _accept(self, listener):
+        try:
+            sock, address = listener.accept()
+        except socket.error:
+            return
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._clients[sock] = StreamClient(sock, address)
+
+    def _read(self, sock):
+        try:
+            chunk = sock.recv(4096)
+        except socket.error:
+            chunk = b''
+        if not chunk:
+            self._disconnect(sock)
+            return
+        try:
+            self._clients[sock].onReceive(chunk)
+        except Exception:
+            self._disconnect(sock) # malformed request, other clients keep streaming
+
+    def _write(self, sock):
+        client = self._clients[sock]
+        try:
+            sent = sock.send(client.outbuf)
+        except socket.error:
+            self._disconnect(sock)
+            return
+        del client.outbuf[:sent]
+
+    def _disconnect(self, sock):
+        self._clients.pop(sock, None)
+        sock.close()
+
+
+# EXAMPLE ######################################################################
+if __name__ == '__main__':
+    import argparse
+    argParser = argparse.ArgumentParser(description='Stream decoded telemetry to local clients')
+    argParser.add_argument('game', choices=['f1_2019', 'assetto_corsa', 'raceroom'])
+    argParser.add_argument('--host', default='127.0.0.1')
+    argParser.add_argument('--port', type=int, default=20800)
+    argParser.add_argument('--rate', type=float, default=60.0, help='reader polling rate in Hz')
+    args = argParser.parse_args()
+
+    server = TelemetryServer(createReader(args.game), args.host, args.port, args.rate)
+    try:
+        server.serveForever()
+    except KeyboardInterrupt:
+        server.stop()